@@ -0,0 +1,55 @@
+"""
+Module containing the command line helpers shared by the finalfits scripts.
+It does not import ROOT (only when applying the arguments) so that argument parsing stays fast.
+"""
+
+import logging
+
+finalfits_verbose_dict = {
+  -2: "CRITICAL",
+  -1: "ERROR",
+  0:  "WARNING",
+  1:  "INFO",
+  2:  "DEBUG"
+}
+
+roofit_verbose_dict = {
+  -2: "FATAL",
+  -1: "ERROR",
+  0:  "WARNING",
+  1:  "PROGRESS",
+  2:  "INFO",
+  3:  "DEBUG"
+}
+
+available_pdfs = ["Gaussian", "DCB", "Bernstein", "Exponential", "Power", "ExpPoly", "Laurent"]
+
+# ROOT compression settings are 100*algorithm + level (algorithms: 1=zlib, 4=lz4)
+compression_settings = {
+  "lz4": 401,
+  "zlib": 101,
+  "none": 0
+}
+
+eval_backends = ["legacy", "cpu", "codegen"]
+
+def addEvalBackendArguments(parser):
+  parser.add_argument("--eval-backend", type=str, default="cpu", choices=eval_backends,
+                      help="RooFit evaluation backend used in fits. Default is cpu (vectorized).")
+
+def comma_separated_two_tuple(string):
+  numbers = string.split(",")
+  if len(numbers) != 2:
+    raise TypeError("Must be two numbers")
+  return tuple(map(float, numbers))
+
+def addLoggingArguments(parser):
+  parser.add_argument("--verbose", "-v", type=int, default=1, choices=range(-2,3),
+                      help="Set verbosity level for finalFits scripts: %s"%(", ".join(f"{key}={value}" for key,value in finalfits_verbose_dict.items())))
+  parser.add_argument("--roofit-verbose", type=int, default=0, choices=range(-2,4),
+                      help="Set verbosity level for RooFit: %s"%(", ".join(f"{key}={value}" for key,value in roofit_verbose_dict.items())))
+
+def applyLoggingArguments(args):
+  import ROOT
+  ROOT.RooMsgService.instance().setGlobalKillBelow(getattr(ROOT.RooFit, roofit_verbose_dict[args.roofit_verbose]))
+  logging.basicConfig(level=getattr(logging, finalfits_verbose_dict[args.verbose]), format=('%(name)-20s: %(levelname)-8s %(message)s'))
@@ -14,6 +14,10 @@ from finalfits import plotting
 
 log = logging.getLogger(__name__)
 
+# request Minuit2 explicitly (cached parameter transformations) rather than relying on the ROOT version's default
+minimizer_type = ("Minuit2", "Migrad")
+ROOT.Math.MinimizerOptions.SetDefaultMinimizer(*minimizer_type)
+
 def prepare_ranges(x, fit_ranges):
   if fit_ranges == ():
     fit_ranges = ((x.getMin(), x.getMax()), )
@@ -25,16 +29,36 @@ def prepare_ranges(x, fit_ranges):
     x.setRange(name, r[0], r[1])
   return ",".join(fit_ranges_dict.keys())
 
+def getExtendedPdf(pdf, datahist):
+  """Return an extended version of pdf.roopdf with the yield set to the number of events in datahist.
+  The extended pdf and its yield are created once per pdf and reused by later fits."""
+  sum_entries = datahist.sumEntries()
+  if pdf.extroopdf is None:
+    pdf.extroopdf_n = ROOT.RooRealVar("n", "n", sum_entries, 0, sum_entries)
+    pdf.extroopdf = ROOT.RooAddPdf("extroopdf", "extroopdf", [pdf.roopdf], [pdf.extroopdf_n])
+  else:
+    pdf.extroopdf_n.setRange(0, sum_entries)
+    pdf.extroopdf_n.setVal(sum_entries)
+  return pdf.extroopdf
+
 def robust_fit(extroopdf, pdf, datahist, fit_ranges_str, n_fits=8, recursive=True,
-               max_n_fits=1024, seed=None):
+               max_n_fits=1024, seed=None, eval_backend="cpu", offset=True, nll=None):
+  # the NLL is built once and minimised from every starting point (including those of recursive calls)
+  # the offset is fixed at the first evaluation so NLL values stay comparable between starting points
+  if nll is None:
+    nll = pdf.roopdf.createNLL(datahist, Range=fit_ranges_str, Offset=offset, **utils.getEvalBackendArgs(eval_backend))
+  minimizer = ROOT.RooMinimizer(nll)
+  minimizer.setMinimizerType(minimizer_type[0])
+  minimizer.setPrintLevel(-1)
+
   nlls = []
   free_params_vals = []
   
   log.info(f"Fitting {pdf.roopdf.GetName()} to {datahist.GetName()}. Doing {n_fits} fits from random initialisations.")
   for i in range(n_fits):
     pdf.randomize_params(None if seed is None else seed + i)
-    r = pdf.roopdf.fitTo(datahist, Range=fit_ranges_str, PrintLevel=-1, Save=True, SumW2Error=True)
-    nlls.append(r.minNll())
+    minimizer.migrad()
+    nlls.append(nll.getVal())
     free_params_vals.append(pdf.free_params_vals)
 
   best_free_params_vals = free_params_vals[np.argmin(nlls)]
@@ -45,7 +69,7 @@ def robust_fit(extroopdf, pdf, datahist, fit_ranges_str, n_fits=8, recursive=Tru
   nll1 = min(nlls[:n_fits//2])
   nll2 = min(nlls[n_fits//2:])
   nll_diff = abs(nll1 - nll2)
-  log.debug(f"Difference in minimum NLL from first and second half of fits is {nll_diff}")
+  log.debug("Difference in minimum NLL from first and second half of fits is %s", nll_diff)
 
   if nll_diff > max_diff:
     log.warning(f"Fit is unstable when starting from {n_fits} random initialisations.")
@@ -53,25 +77,32 @@ def robust_fit(extroopdf, pdf, datahist, fit_ranges_str, n_fits=8, recursive=Tru
     if recursive and n_fits < max_n_fits:
       n_fits_more = n_fits * 2
       robust_fit(extroopdf, pdf, datahist, fit_ranges_str, n_fits_more, 
-                 max_n_fits=max_n_fits, seed=seed)
+                 max_n_fits=max_n_fits, seed=seed, eval_backend=eval_backend, offset=offset, nll=nll)
     else:
       raise Exception(f"Fit is unstable. Tried {n_fits} from random places and did not find acceptable convergence. Halted because we reached maximum number of fits ({max_n_fits}).")
+  else:
+    # final fit starting from the best minimum to get the (SumW2 corrected) covariance matrix
+    pdf.fit_result = pdf.roopdf.fitTo(datahist, Range=fit_ranges_str, PrintLevel=-1, Save=True, SumW2Error=True,
+                                      Offset=offset, Minimizer=minimizer_type, **utils.getEvalBackendArgs(eval_backend))
 
-def fit(pdf, datahist, fit_ranges=(), method="robust", seed=None):
+def fit(pdf, datahist, fit_ranges=(), method="robust", seed=None, eval_backend="cpu", offset=True):
   fit_ranges_str = prepare_ranges(pdf.x, fit_ranges)
 
   # extended fit required to get valid results from fits in ranges (see https://root.cern/doc/v630/rf204b__extendedLikelihood__rangedFit_8py.html)
-  n = ROOT.RooRealVar("n", "n", datahist.sumEntries(), 0, datahist.sumEntries())
-  extroopdf = ROOT.RooAddPdf("extroopdf", "extroopdf", [pdf.roopdf], [n])
+  # when fitting the full range of x the plain pdf is equivalent and avoids the extra yield parameter
+  full_range = len(fit_ranges) == 0 or (len(fit_ranges) == 1 and tuple(fit_ranges[0]) == (pdf.x.getMin(), pdf.x.getMax()))
+  extroopdf = pdf.roopdf if full_range else getExtendedPdf(pdf, datahist)
 
   assert method in ["robust", "from_defaults", "randomize"], f"Unknown fitting method: {method}"
   if method == "robust":
-    robust_fit(extroopdf, pdf, datahist, fit_ranges_str, seed=seed)
+    robust_fit(extroopdf, pdf, datahist, fit_ranges_str, seed=seed, eval_backend=eval_backend, offset=offset)
   else:
     if method == "randomize":
       pdf.randomize_params(seed)
-    r = extroopdf.fitTo(datahist, Range=fit_ranges_str, PrintLevel=-1, SumW2Error=True, Save=True)
+    r = extroopdf.fitTo(datahist, Range=fit_ranges_str, PrintLevel=-1, SumW2Error=True, Save=True,
+                        Offset=offset, Minimizer=minimizer_type, **utils.getEvalBackendArgs(eval_backend))
     r.Print()
+    pdf.fit_result = r
 
   pdf.check_bounds()
   
@@ -82,7 +113,7 @@ def fit(pdf, datahist, fit_ranges=(), method="robust", seed=None):
   return {"twoNLL": twoNLL, "gof_pval": gof_pval}
 
 def main(in_file, out_file, pdf_name="Gaussian", order=1, fit_ranges=(), #
-         nbins=None, plot_savepath=None, plot_range=None, method="robust"):
+         nbins=None, plot_savepath=None, plot_range=None, method="robust", eval_backend="cpu"):
   log.info(f"Fitting {pdf_name} (order {order}) to events in {in_file} in ranges: {fit_ranges}")
   x, data = utils.readEvents(in_file)
 
@@ -97,7 +128,7 @@ def main(in_file, out_file, pdf_name="Gaussian", order=1, fit_ranges=(), #
 
   log.debug("Initialising fit function")
   pdf = getattr(pdfs, pdf_name)(x, postfix="cat0", order=order)
-  fit(pdf, datahist, fit_ranges=fit_ranges, method=method)
+  fit(pdf, datahist, fit_ranges=fit_ranges, method=method, eval_backend=eval_backend)
 
   if plot_savepath is not None:
     xlim = (x.getMin(), x.getMax()) if plot_range == () else plot_range
@@ -107,7 +138,7 @@ def main(in_file, out_file, pdf_name="Gaussian", order=1, fit_ranges=(), #
   log.info("Create output workspace")
   wsig = ROOT.RooWorkspace("wsig", "wsig")
   wsig.Import(datahist)
-  wsig.Import(pdf.roopdf)
+  wsig.Import(pdf.roopdf, RecycleConflictNodes=True, Silence=True)
   log.info(f"Writing workspace to {out_file}")
   wsig.writeToFile(out_file)
 
@@ -118,6 +149,7 @@ if __name__=="__main__":
                     description='Fits signal',
                     epilog='Text at the bottom of help')
   utils.addLoggingArguments(parser)
+  utils.addEvalBackendArguments(parser)
   parser.add_argument("in_file", type=str)
   parser.add_argument("out_file", type=str)
   parser.add_argument("--pdf-name", "-p", type=str, default="Gaussian", choices=pdfs.available_pdfs)
@@ -132,4 +164,4 @@ if __name__=="__main__":
 
   utils.applyLoggingArguments(args)  
   main(args.in_file, args.out_file, args.pdf_name, args.order, args.fit_ranges,
-       args.nbins, args.plot_savepath, args.plot_range, args.method)
\ No newline at end of file
+       args.nbins, args.plot_savepath, args.plot_range, args.method, args.eval_backend)
\ No newline at end of file
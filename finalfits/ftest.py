@@ -1,5 +1,6 @@
 import logging
 
+import numpy as np
 import ROOT
 
 from finalfits import plotting, fitting, utils, pdfs
@@ -73,13 +74,13 @@ def filterResults(results, gof_threshold=0.01, ftest_threshold=0.05):
   return results
 
 def createEnvelope(results):
-  flattened_results = [res for family in results.keys() for res in results[family]]
+  flattened_results = [res for family_results in results.values() for res in family_results]
   pdfs = ROOT.RooArgList(*[res["pdf"].roopdf for res in flattened_results])
-  gofs = [res["gof_pval"] for family in results.keys() for res in results[family]]
+  gofs = np.fromiter((res["gof_pval"] for res in flattened_results), float, len(flattened_results))
   
   pdfIndex = ROOT.RooCategory("pdfIndex", "pdfIndex")
   multipdf = ROOT.RooMultiPdf("multipdf", "multipdf", pdfIndex, pdfs)
-  pdfIndex.setIndex(gofs.index(max(gofs)))
+  pdfIndex.setIndex(int(gofs.argmax()))
 
   return pdfIndex, multipdf
 
@@ -109,7 +110,7 @@ if __name__=="__main__":
   parser.add_argument("--max-dof", "-o", type=int, default=5)
   parser.add_argument("--plot-savepath", type=str, default=None)
   parser.add_argument("--fit-ranges", type=utils.comma_separated_two_tuple, nargs="+", default=[(100,120), (130,180)])
-  parser.add_argument("--blinded-regions", type=str, nargs="+", default=["115,135"])
+  parser.add_argument("--blinded-regions", type=utils.comma_separated_two_tuple, nargs="+", default=[(115,135)])
   parser.add_argument("--do-all-orders", action="store_true")
   args = parser.parse_args()
 
@@ -13,9 +13,9 @@ import numpy as np
 import ROOT
 
 from finalfits import utils
+from finalfits.arguments import available_pdfs
 
 log = logging.getLogger(__name__)
-available_pdfs = ["Gaussian", "DCB", "Bernstein", "Exponential", "Power", "ExpPoly", "Laurent"]
 
 def set_pre_postfix(*args: tuple[ROOT.TNamed, ...], prefix: str = "", postfix: str = "",
                     change_name: bool = True, change_title: bool = False) -> None:
@@ -56,6 +56,10 @@ class FinalFitsPdf:
     if order > self.max_order:
       raise ValueError(f"Order of {self.__class__.__name__} is too high. Max order is {self.max_order}.")
     self.order = order
+    self.fit_result = None
+    self.extroopdf = None # extended version of roopdf and its yield, created when first needed by fitting.fit
+    self.extroopdf_n = None
+    self.norm_integral = None # integral of roopdf over x, created when first needed by __call__
     self.init_param_bounds(bounds)
     self.init_transforms(transforms)
     self.init_polys(polys)
@@ -65,7 +69,11 @@ class FinalFitsPdf:
     set_pre_postfix(self.roopdf, *self.params.values(), prefix=prefix, postfix=postfix)
 
   def __call__(self, xi):
-    return utils.getVal(self.roopdf, self.x, xi)
+    if hasattr(xi, "__len__"):
+      return utils.getValArray(self.roopdf, self.x, xi)
+    if self.norm_integral is None:
+      self.norm_integral = self.roopdf.createIntegral(self.x)
+    return utils.getValScalar(self.roopdf, self.x, xi, self.norm_integral)
 
   def get_final_shape_param_names(self):
     """Return all the names of the shape parameters used to initialize the pdf"""
@@ -194,8 +202,23 @@ class FinalFitsPdf:
   def final_params_vals(self):
     return {k: v.getVal() for (k, v) in self.final_params.items()}
   
+  def fit_result_is_current(self) -> bool:
+    """Whether the free parameters are still at the values of self.fit_result.
+    They are not after e.g. randomize_params, setting free_params_vals or a fit that did not go through fitting.fit."""
+    if self.fit_result is None:
+      return False
+    fitted = self.fit_result.floatParsFinal()
+    for p in self.free_params.values():
+      fitted_p = fitted.find(p.GetName())
+      if fitted_p and not np.isclose(p.getVal(), fitted_p.getVal(), rtol=1e-9, atol=0):
+        return False
+    return True
+
   @property
   def final_params_errs(self):
+    if self.fit_result_is_current():
+      return self.propagate_errors(self.fit_result)
+
     final_params_errs = {}
     for name, p in self.final_params.items():
       if isinstance(p, ROOT.RooRealVar):
@@ -205,6 +228,41 @@ class FinalFitsPdf:
 
       final_params_errs[name] = err
     return final_params_errs
+
+  def propagate_errors(self, fit_result: ROOT.RooFitResult) -> dict[str, float]:
+    """Propagate the covariance matrix of a fit result to the final parameters.
+
+    The jacobian of all final parameters is built by varying each free parameter once,
+    so the cost scales with the number of free parameters instead of calling
+    getPropagatedError (which varies every parameter) for each final parameter.
+
+    Args:
+        fit_result (ROOT.RooFitResult): fit result containing the covariance matrix
+
+    Returns:
+        dict[str, float]: errors of the final parameters
+    """
+    final_params = self.final_params
+    free_params = [p for p in self.free_params.values() if fit_result.floatParsFinal().find(p.GetName())]
+    
+    cov = fit_result.reducedCovarianceMatrix(ROOT.RooArgList(*free_params))
+    cov = np.array([[cov(i, j) for j in range(len(free_params))] for i in range(len(free_params))])
+    
+    jacobian = np.zeros((len(final_params), len(free_params)))
+    for j, p in enumerate(free_params):
+      val = p.getVal()
+      step = np.sqrt(cov[j, j])
+      if step == 0:
+        continue
+      p.setVal(val + step)
+      up = np.array([f.getVal() for f in final_params.values()])
+      p.setVal(val - step)
+      down = np.array([f.getVal() for f in final_params.values()])
+      p.setVal(val)
+      jacobian[:, j] = (up - down) / (2 * step)
+
+    errs = np.sqrt(np.einsum("ij,jk,ik->i", jacobian, cov, jacobian))
+    return dict(zip(final_params.keys(), errs))
       
   def randomize_params(self, seed: int = None) -> None:
     """randomize the parameters of the pdf
@@ -212,11 +270,13 @@ class FinalFitsPdf:
     Args:
         seed (bool, optional): random seed. Defaults to None.
     """
-    print("randomizing")
+    free_params = list(self.free_params.values())
+    lows = np.fromiter((p.getMin() for p in free_params), float, len(free_params))
+    highs = np.fromiter((p.getMax() for p in free_params), float, len(free_params))
+    
     rng = np.random.default_rng(seed)
-    for p in self.free_params.values():
-      print(p.GetName(), p.getMin(), p.getMax())
-      p.setVal(rng.uniform(p.getMin(), p.getMax()))
+    for p, val in zip(free_params, rng.uniform(lows, highs)):
+      p.setVal(val)
 
   def get_dof(self) -> int:
     """Get the degrees of freedom of the pdf. This is the number of free parameters of the pdf.
@@ -228,8 +288,16 @@ class FinalFitsPdf:
 
   def check_bounds(self) -> None:
     """Check if any of the parameters are at their bounds and log a warning if they are."""
-    for p in self.free_params.values():
-      if np.isclose(p.getVal(), p.getMin(), rtol=0.01) or np.isclose(p.getVal(), p.getMax(), rtol=0.01):
+    free_params = list(self.free_params.values())
+    vals = np.fromiter((p.getVal() for p in free_params), float, len(free_params))
+    lows = np.fromiter((p.getMin() for p in free_params), float, len(free_params))
+    highs = np.fromiter((p.getMax() for p in free_params), float, len(free_params))
+    # same tolerance as np.isclose(val, bound, rtol=0.01) but evaluated for all parameters at once
+    at_bounds = ((np.abs(vals - lows) <= 1e-8 + 0.01*np.abs(lows)) |
+                 (np.abs(vals - highs) <= 1e-8 + 0.01*np.abs(highs)))
+
+    for p, at_bound in zip(free_params, at_bounds):
+      if at_bound:
         log.warning("Parameter %s from pdf %s is at its bounds", p.GetName(), self.roopdf.GetName())
         log.warning("%s=%s, low=%f, high=%f", p.GetName(), p.getVal(), p.getMin(), p.getMax())
         
@@ -255,7 +323,7 @@ class FinalFitsPdfSum(FinalFitsPdf):
         self.pdfs.append(self.roopdf_constructor(subname, subname, self.x_norm, *params_subset))
         
       self.roopdf = ROOT.RooAddPdf(name, name, self.pdfs, self.coeffs, True)
-      self.roopdf.fixCoefNormalization(self.x_norm)
+      self.roopdf.fixCoefNormalization(self.x)
 
 class Gaussian(FinalFitsPdfSum):
   roopdf_constructor = ROOT.RooGaussian
@@ -319,4 +387,4 @@ class Laurent(FinalFitsPdf):
     self.pdfs = [ROOT.RooPower(f"{name}component{i}", f"{name}component{i}", self.x_norm, 
                                ROOT.RooFit.RooConst(-4+g(i))) for i in range(self.order+1)]
     self.roopdf = ROOT.RooAddPdf(name, name, self.pdfs, list(self.params.values()), True)
-    self.roopdf.fixCoefNormalization(self.x_norm)
\ No newline at end of file
+    self.roopdf.fixCoefNormalization(self.x)
\ No newline at end of file
@@ -11,6 +11,18 @@ log = logging.getLogger(__name__)
 mplhep.style.use("CMS")
 ROOT.gROOT.SetBatch(True)
 
+_xi_cache = {}
+
+def _getXi(xmin, xmax, n=200):
+  """Return a cached (read-only) grid of n points between xmin and xmax used to draw pdf curves.
+  200 points are visually indistinguishable from denser grids for the smooth pdfs drawn here."""
+  key = (xmin, xmax, n)
+  if key not in _xi_cache:
+    xi = np.linspace(xmin, xmax, n)
+    xi.flags.writeable = False
+    _xi_cache[key] = xi
+  return _xi_cache[key]
+
 def plotHist(datahist, savepath=None, xlim=None):
   log.info("Plotting histogram")
   bin_centers, hist, uncert = utils.RooDataHist2Numpy(datahist, xlim=xlim)
@@ -39,12 +51,16 @@ def plotFit(datahist, pdf, x, savepath=None, xlim=None):
   bin_centers, hist, uncert = plotHist(datahist, None, xlim)
   bin_width = bin_centers[1] - bin_centers[0]
   sf = datahist.sumEntries() * bin_width
-  xi = np.linspace(xlim[0], xlim[1], 1000)
-  plt.plot(xi, utils.getVal(roopdf, x, xi)*sf)
+  xi = _getXi(xlim[0], xlim[1])
+  # evaluate the curve and the bin centres together: one batched evaluation instead of two
+  vals = utils.getValArray(roopdf, x, np.concatenate([xi, bin_centers]))*sf
+  plt.plot(xi, vals[:len(xi)])
 
   text = str(roopdf.getTitle()) + " Fit"
   plt.text(0.05, 0.95, text, verticalalignment='top', transform=plt.gca().transAxes)
-  chi2 = ((hist-utils.getVal(roopdf, x, bin_centers)*sf)**2 / uncert**2).sum() / len(hist) #chi2 per d.o.f
+  residuals = hist - vals[len(xi):]
+  residuals /= uncert
+  chi2 = np.dot(residuals, residuals) / len(hist) #chi2 per d.o.f
   plt.text(max(xi), max(hist+uncert), r"$\chi^2 / dof$=%.2f"%chi2, verticalalignment='top', horizontalalignment='right')
   
   if isinstance(pdf, pdfs.FinalFitsPdf):
@@ -81,10 +97,10 @@ def plotFamily(datahist, x, results, savepath, blinded_regions=[], title=None):
   bin_width = utils.histPlotTemplate(datahist, xlim, blinded_regions)
 
   sf = datahist.sumEntries() * bin_width
-  xi = np.linspace(xlim[0], xlim[1], 1000)
+  xi = _getXi(xlim[0], xlim[1])
   for res in results:
     label = f"{title} {res['dof']}: " + r"$p_{ftest}=%.2f$, "%res["ftest_pval"] + r"$p_{gof}=%.2f$ "%res["gof_pval"]
-    plt.plot(xi, utils.getVal(res["pdf"].roopdf, x, xi)*sf, label=label)
+    plt.plot(xi, utils.getValArray(res["pdf"].roopdf, x, xi)*sf, label=label)
 
   plt.legend()
   utils.savefig(savepath)
@@ -97,15 +113,15 @@ def plotEnvelope(datahist, x, results, savepath, blinded_regions=[]):
   bin_width = utils.histPlotTemplate(datahist, xlim, blinded_regions)
   
   sf = datahist.sumEntries() * bin_width
-  xi = np.linspace(xlim[0], xlim[1], 1000)
+  xi = _getXi(xlim[0], xlim[1])
 
-  gofs = [res["gof_pval"] for family in results.keys() for res in results[family]]
-  best_gof_index = gofs.index(max(gofs))
+  flattened_results = [(family, res) for family, family_results in results.items() for res in family_results]
+  gofs = np.fromiter((res["gof_pval"] for _, res in flattened_results), float, len(flattened_results))
+  best_gof_index = int(gofs.argmax())
 
-  for family in results.keys():
-    for res in results[family]:
-      label = f"{family} {res['dof']}"
-      plt.plot(xi, utils.getVal(res["pdf"].roopdf, x, xi)*sf, label=label)
+  for family, res in flattened_results:
+    label = f"{family} {res['dof']}"
+    plt.plot(xi, utils.getValArray(res["pdf"].roopdf, x, xi)*sf, label=label)
 
   legend = plt.legend()
   handle = legend.get_texts()[best_gof_index]
@@ -4,12 +4,35 @@ Module to help with generating toy datasets. Primarily used for testing purposes
 
 import logging
 
+import numpy as np
+import ROOT
+
+from finalfits import utils
+
 log = logging.getLogger(__name__)
 
-def generateBinned(x, pdf, nevents, w=None, postfix="", randomize=False, asimov=False):
+def generateAsimov(x, roopdf, nevents):
+  """Asimov dataset from a single batched evaluation of roopdf at the bin centres of x.
+  Bin contents are nevents * pdf(bin centre) * bin width, like generateBinned(..., ExpectedData=True)."""
+  bin_boundaries = np.linspace(x.getMin(), x.getMax(), x.getBins()+1)
+  bin_centers = (bin_boundaries[:-1] + bin_boundaries[1:]) / 2
+  bin_width = bin_boundaries[1] - bin_boundaries[0]
+
+  expected = utils.getValArray(roopdf, x, bin_centers)
+  expected *= nevents * bin_width
+  return ROOT.RooDataHist.from_numpy(expected, [x], bins=[x.getBins()], ranges=[(x.getMin(), x.getMax())])
+
+def generateBinned(x, pdf, nevents, w=None, postfix="", randomize=False, asimov=False, integrate_bins=0):
   if randomize:
     pdf.randomize_params()
-  data = pdf.roopdf.generateBinned(x, nevents, ExpectedData=asimov)
+  roopdf = pdf.roopdf
+  if integrate_bins > 0:
+    # integrate the pdf over each bin (to precision integrate_bins) instead of using its value at the bin centre
+    roopdf = ROOT.RooBinSamplingPdf(f"binned_{pdf.roopdf.GetName()}", "", x, pdf.roopdf, integrate_bins)
+  if asimov:
+    data = generateAsimov(x, roopdf, nevents)
+  else:
+    data = roopdf.generateBinned(x, nevents)
   data.SetName(f"data{postfix}")
   if w is not None:
     w.Import(data)
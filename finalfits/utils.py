@@ -1,44 +1,58 @@
 import os
+import re
 import logging
+import functools
 
 import numpy as np
 import matplotlib.pyplot as plt
 import ROOT
 import mplhep
 
+# command line helpers live in a module without ROOT/matplotlib so scripts can parse arguments (and -h) quickly
+from finalfits.arguments import (finalfits_verbose_dict, roofit_verbose_dict, eval_backends, addEvalBackendArguments,
+                                 comma_separated_two_tuple, addLoggingArguments, applyLoggingArguments,
+                                 compression_settings)
+
 log = logging.getLogger(__name__)
 
 def RooDataHist2Numpy(datahist, xlim=None):
-  nBins = datahist.get()[0].getBins()
-  
-  bin_centers = []
-  hist = []
-  uncert = []
+  x = datahist.get()[0]
+  nBins = x.getBins()
 
-  for i in range(nBins):
-    bin_center = datahist.get(i)[0].getVal()
-    if (xlim is None) or (xlim[0] <= bin_center <= xlim[1]):
-      bin_centers.append(datahist.get(i)[0].getVal())
-      hist.append(datahist.weight(i))
-      uncert.append(datahist.weightError(etype=ROOT.RooAbsData.ErrorType.SumW2))
+  bin_boundaries = np.linspace(x.getMin(), x.getMax(), nBins+1)
+  bin_centers = (bin_boundaries[:-1] + bin_boundaries[1:]) / 2
+  hist = np.frombuffer(datahist.weightArray(), dtype=np.float64, count=nBins).copy()
+  sumw2 = datahist.sumW2Array()
+  # no sum of weights squared is stored (null pointer) for unit weights, where it equals the weights like in weightSquared
+  uncert = np.sqrt(np.frombuffer(sumw2, dtype=np.float64, count=nBins) if sumw2 else hist)
 
-  bin_centers = np.array(bin_centers)
-  hist = np.array(hist)
-  uncert = np.array(uncert)
+  if xlim is not None:
+    inside = np.logical_and(bin_centers >= xlim[0], bin_centers <= xlim[1])
+    bin_centers, hist, uncert = bin_centers[inside], hist[inside], uncert[inside]
 
   return bin_centers, hist, uncert
 
+def getValArray(pdf, xvar, xarr):
+  """Normalised pdf values at every point of xarr, evaluated in one batched pass"""
+  # points are clipped to the range of xvar like setVal would
+  xarr = np.clip(np.asarray(xarr, dtype=np.float64), xvar.getMin(), xvar.getMax())
+  data = ROOT.RooDataSet.from_numpy({xvar.GetName(): xarr}, [xvar])
+  # getValues normalises over the observables of the dataset
+  return np.array(pdf.getValues(data))
+
+def getValScalar(pdf, xvar, x, norm_integral=None):
+  """Normalised pdf value at a single point x.
+  norm_integral (pdf.createIntegral(xvar)) can be passed to reuse it between calls, it tracks parameter changes itself."""
+  if norm_integral is None:
+    norm_integral = pdf.createIntegral(xvar)
+  xvar.setVal(x)
+  return pdf.getVal() / norm_integral.getVal()
+
 def getVal(pdf, xvar, xval):
   if hasattr(xval, "__len__"):
-    vals = []
-    for xi in xval:
-      xvar.setVal(xi)
-      vals.append(pdf.getVal())
-    val = np.array(vals)
+    return getValArray(pdf, xvar, xval)
   else:
-    xvar.setVal(xval)
-    val = pdf.getVal()
-  return val / pdf.createIntegral(xvar).getVal()
+    return getValScalar(pdf, xvar, xval)
 
 def readEvents(filename):
   log.info(f"Loading workspace from {filename}")
@@ -48,15 +62,21 @@ def readEvents(filename):
   data = w.data("data")  
   return x, data
 
+def writeWorkspace(w, out_file, compression="lz4"):
+  """Write workspace to out_file (recreating it) using one of the compression_settings"""
+  log.info(f"Writing workspace to {out_file}")
+  f = ROOT.TFile(out_file, "RECREATE", "", compression_settings[compression])
+  w.Write()
+  f.Close()
+
 def getNBinsFitted(x, fit_ranges):
   bin_boundaries = np.linspace(x.getMin(), x.getMax(), x.getBins()+1)
   bin_centers = (bin_boundaries[:-1] + bin_boundaries[1:]) / 2
   
-  inside_ranges = np.zeros_like(bin_centers, dtype=bool)
-  for r in fit_ranges:
-    inside_ranges = inside_ranges | ((bin_centers > r[0]) & (bin_centers < r[1]))
+  ranges = np.asarray(fit_ranges, dtype=float).reshape(-1, 2)
+  inside_ranges = np.any((bin_centers[:, None] > ranges[:, 0]) & (bin_centers[:, None] < ranges[:, 1]), axis=1)
 
-  nbins_fitted = sum(inside_ranges)
+  nbins_fitted = int(np.count_nonzero(inside_ranges))
   return nbins_fitted
 
 
@@ -71,30 +91,32 @@ title_dict = {
       "c":r"$c$"
       }
 
+_title_pattern = re.compile(r"^([A-Za-z]+)(\d?)$")
+
+@functools.lru_cache(maxsize=None)
 def textify(title):
-  if (title not in title_dict) and (title[:-1] not in title_dict):
-    return title
-  else:
-    if title[-1].isdigit():
-      idx = int(title[-1])
-      title = title[:-1]
-    else:
-      idx = None
-
-    title = title_dict[title]
-    if idx is not None:
-      title = title[:-1] + "_{%d}$"%idx
-    
+  m = _title_pattern.match(title)
+  if (m is None) or (m.group(1) not in title_dict):
     return title
+
+  base, idx = m.groups()
+  title = title_dict[base]
+  if idx:
+    title = title[:-1] + "_{%d}$"%int(idx)
+  
+  return title
   
 def savefig(savepath, extensions=["png", "pdf"], keep=False):
   directory = "/".join(savepath.split("/")[:-1])
   os.makedirs(directory, exist_ok=True)
+  fig = plt.gcf()
   for extension in extensions:
     log.info(f"Saving figure to {savepath}.{extension}")
-    plt.savefig(f"{savepath}.{extension}")
+    # fastest zlib level for pngs: write time matters more than file size for these plots
+    kwargs = {"pil_kwargs": {"compress_level": 1}} if extension == "png" else {}
+    fig.savefig(f"{savepath}.{extension}", **kwargs)
   if not keep:
-    plt.clf()
+    fig.clear()
 
 def cmslabel():
   mplhep.cms.label("Work in Progress", data=True, lumi=138, com=13.6)
@@ -103,13 +125,10 @@ def histPlotTemplate(datahist, xlim, blinded_regions=[]):
   bin_centers, hist, uncert = RooDataHist2Numpy(datahist, xlim=xlim)
   bin_width = bin_centers[1] - bin_centers[0]
 
-  blinded_idx = []
-  for region in blinded_regions:
-    for idx, bin_center in enumerate(bin_centers):
-      if float(region.split(",")[0]) < bin_center < float(region.split(",")[1]):
-        blinded_idx.append(idx)
+  bounds = np.asarray(blinded_regions, dtype=float).reshape(-1, 2)
+  blinded = np.any((bin_centers[:, None] > bounds[:, 0]) & (bin_centers[:, None] < bounds[:, 1]), axis=1)
   
-  s = ~np.isin(np.arange(len(bin_centers)), blinded_idx)
+  s = ~blinded
 
   plt.errorbar(bin_centers[s], hist[s], xerr=bin_width/2, yerr=uncert[s], capsize=2, fmt='k.')
 
@@ -119,35 +138,12 @@ def histPlotTemplate(datahist, xlim, blinded_regions=[]):
   cmslabel()
   return bin_width
 
-finalfits_verbose_dict = {
-  -2: "CRITICAL",
-  -1: "ERROR",
-  0:  "WARNING",
-  1:  "INFO",
-  2:  "DEBUG"
-}
-
-roofit_verbose_dict = {
-  -2: "FATAL",
-  -1: "ERROR",
-  0:  "WARNING",
-  1:  "PROGRESS",
-  2:  "INFO",
-  3:  "DEBUG"
-}
-
-def comma_separated_two_tuple(string):
-  numbers = string.split(",")
-  if len(numbers) != 2:
-    raise TypeError("Must be two numbers")
-  return tuple(map(float, numbers))
-
-def addLoggingArguments(parser):
-  parser.add_argument("--verbose", "-v", type=int, default=1, choices=range(-2,3),
-                      help="Set verbosity level for finalFits scripts: %s"%(", ".join(f"{key}={value}" for key,value in finalfits_verbose_dict.items())))
-  parser.add_argument("--roofit-verbose", type=int, default=0, choices=range(-2,4),
-                      help="Set verbosity level for RooFit: %s"%(", ".join(f"{key}={value}" for key,value in roofit_verbose_dict.items())))
-
-def applyLoggingArguments(args):
-  ROOT.RooMsgService.instance().setGlobalKillBelow(getattr(ROOT.RooFit, roofit_verbose_dict[args.roofit_verbose]))
-  logging.basicConfig(level=getattr(logging, finalfits_verbose_dict[args.verbose]), format=('%(name)-20s: %(levelname)-8s %(message)s'))
\ No newline at end of file
+def getEvalBackendArgs(eval_backend):
+  """Keyword arguments selecting the RooFit likelihood evaluation backend for fitTo.
+  EvalBackend only exists from ROOT 6.32, before that the vectorized "cpu" backend is BatchMode."""
+  if ROOT.gROOT.GetVersionInt() >= 63200:
+    return {"EvalBackend": eval_backend}
+  else:
+    if eval_backend == "codegen":
+      log.warning("The codegen evaluation backend needs ROOT >= 6.32, using the legacy backend instead")
+    return {"BatchMode": eval_backend == "cpu"}
@@ -1,4 +1,6 @@
+import os
 import logging
+import multiprocessing
 
 import ROOT
 from tqdm import tqdm
@@ -7,8 +9,31 @@ from finalfits import pdfs, utils, toys
 
 log = logging.getLogger(__name__)
 
+_worker = {}
+
+def _initWorker(pdf_name, order, xlim, nbins, nevents, randomize, asimov, integrate_bins, seed):
+  """Build the RooFit objects once per worker process instead of shipping them from the parent"""
+  x = ROOT.RooRealVar("x", "x", xlim[0], xlim[1])
+  x.setBins(nbins)
+  pdf = getattr(pdfs, pdf_name)(x, order=order)
+  _worker.update(x=x, pdf=pdf, nevents=nevents, randomize=randomize, asimov=asimov,
+                 integrate_bins=integrate_bins, seed=seed)
+
+def _generateOne(i):
+  """Generate dataset i. Seeded by the dataset index so toys are independent between workers and reproducible."""
+  ROOT.RooRandom.randomGenerator().SetSeed(_worker["seed"] + i)
+  if _worker["randomize"]:
+    _worker["pdf"].randomize_params(_worker["seed"] + i)
+  return toys.generateBinned(_worker["x"], _worker["pdf"], _worker["nevents"], asimov=_worker["asimov"],
+                             integrate_bins=_worker["integrate_bins"], postfix=i)
+
 def main(out_file, pdf_name="Gaussian", order=1, nevents=10000, randomize=False,
-         ndatasets=0, xlim=(100, 180), nbins=None, asimov=False):
+         ndatasets=0, xlim=(100, 180), nbins=None, asimov=False, integrate_bins=0, n_workers=None, seed=1,
+         compression="lz4"):
+
+  if seed < 1:
+    # TRandom3::SetSeed(0) picks a different seed every time, so seed + i must never be 0
+    raise ValueError(f"seed must be >= 1 for reproducible toys, got {seed}")
 
   if nbins is None:
     nbins = int(xlim[1]-xlim[0]) # 1 bin per GeV
@@ -26,19 +51,28 @@ def main(out_file, pdf_name="Gaussian", order=1, nevents=10000, randomize=False,
   pdf.roopdf.Print()
   if randomize:
     pdf.randomize_params()
-  log.debug(str(pdf.roopdf).strip("\n"))
-  for p in pdf.params:
-    log.debug(str(p).strip("\n"))
+  if log.isEnabledFor(logging.DEBUG):
+    log.debug(str(pdf.roopdf).strip("\n"))
+    for p in pdf.params:
+      log.debug(str(p).strip("\n"))
 
   w = ROOT.RooWorkspace("w", "workspace")
 
   if ndatasets == 0:
-    toys.generateBinned(x, pdf, nevents, w, asimov=asimov)
+    toys.generateBinned(x, pdf, nevents, w, asimov=asimov, integrate_bins=integrate_bins)
   else:
-    for i in tqdm(range(ndatasets)):
-      toys.generateBinned(x, pdf, nevents, w, randomize=randomize, asimov=asimov, postfix=i)
+    if n_workers is None:
+      n_workers = os.cpu_count()
+    chunksize = max(1, ndatasets // (4*n_workers))
+    log.info("Generating datasets with %d worker(s)", n_workers)
+
+    initargs = (pdf_name, order, xlim, nbins, nevents, randomize, asimov, integrate_bins, seed)
+    with multiprocessing.Pool(n_workers, initializer=_initWorker, initargs=initargs) as pool:
+      # datasets are named by index so the order they come back in does not matter
+      for data in tqdm(pool.imap_unordered(_generateOne, range(ndatasets), chunksize=chunksize), total=ndatasets):
+        w.Import(data)
 
-  w.writeToFile(out_file)
+  utils.writeWorkspace(w, out_file, compression)
 
 if __name__=="__main__":
   import argparse
@@ -54,9 +88,15 @@ if __name__=="__main__":
   parser.add_argument("--xlim", type=utils.comma_separated_two_tuple, default=(100,180), help="Limits on x. Default is 100,180.")
   parser.add_argument("--nbins", type=int, default=None, help="Number of bins in histogram. Default is 1/GeV.")
   parser.add_argument("--asimov", action="store_true", help="Generated asimov dataset(s)")
+  parser.add_argument("--integrate-bins", type=float, default=0,
+                      help="Integrate the pdf over each bin to this precision when generating. Default (0) uses the pdf value at the bin centre.")
+  parser.add_argument("--n-workers", type=int, default=None, help="Number of processes used to generate multiple datasets. Default is the number of CPUs.")
+  parser.add_argument("--seed", type=int, default=1, help="Base random seed (>= 1) when generating multiple datasets. Dataset i uses seed+i.")
+  parser.add_argument("--compression", type=str, default="lz4", choices=list(utils.compression_settings),
+                      help="Compression of the output file. Default is lz4 (fast writes, slightly larger files).")
   args = parser.parse_args()
 
   utils.applyLoggingArguments(args)  
   main(args.out_file, args.pdf_name, args.order, args.nevents,
        args.randomize, args.ndatasets, args.xlim, args.nbins,
-       args.asimov)
\ No newline at end of file
+       args.asimov, args.integrate_bins, args.n_workers, args.seed, args.compression)
\ No newline at end of file
@@ -13,7 +13,8 @@ def get_roocategory(category_names):
     cat.defineType(cat_name)
   return cat
 
-def main(in_file, out_file, masses, pdf_name="Gaussian", order=1, plot_savepath=None):
+def main(in_file, out_file, masses, pdf_name="Gaussian", order=1, plot_savepath=None, integrate_bins=-1,
+         eval_backend="cpu"):
   f = ROOT.TFile(in_file)
   w = f.Get("w")
   x = w.var("x")
@@ -32,15 +33,18 @@ def main(in_file, out_file, masses, pdf_name="Gaussian", order=1, plot_savepath=
   
   cat = get_roocategory(category_names)
   w = ROOT.RooWorkspace("wtemp", "wtemp")
-  w.Import({pdf.roopdf, cat})
+  w.Import({pdf.roopdf, cat}, Silence=True)
   sct = ROOT.RooSimWSTool(w)
   simpdf = sct.build("simpdf", pdf.roopdf.GetName(), SplitParam=("MH", "cat"))
   
   for m in category_names:
+    # MH is fixed per category: constant parameters let RooFit cache the MH-dependent branches once
     w.var(f"MH_{m}").setVal(float(m))
+    w.var(f"MH_{m}").setConstant(True)
     
   combdata = ROOT.RooDataHist("combdata", "combdata", ROOT.RooArgList(x), Index=cat, Import=datahists)
-  res = simpdf.fitTo(combdata, PrintLevel=-1, Save=True)
+  res = simpdf.fitTo(combdata, PrintLevel=-1, Save=True, IntegrateBins=integrate_bins, Offset=True,
+                     Minimizer=fitting.minimizer_type, **utils.getEvalBackendArgs(eval_backend))
   res.Print()
 
   if plot_savepath:
@@ -50,7 +54,7 @@ def main(in_file, out_file, masses, pdf_name="Gaussian", order=1, plot_savepath=
     utils.savefig(plot_savepath)
 
   wout = ROOT.RooWorkspace("w", "w")
-  wout.Import(w.pdf(pdf.roopdf.GetName()))
+  wout.Import(w.pdf(pdf.roopdf.GetName()), RecycleConflictNodes=True, Silence=True)
   wout.writeToFile(out_file)
 
 if __name__=="__main__":
@@ -60,13 +64,17 @@ if __name__=="__main__":
                     description='Fits signal',
                     epilog='Text at the bottom of help')
   utils.addLoggingArguments(parser)
+  utils.addEvalBackendArguments(parser)
   parser.add_argument("in_file", type=str)
   parser.add_argument("out_file", type=str)
   parser.add_argument("--pdf-name", "-p", type=str, default="Gaussian", choices=["DCB", "Gaussian"])
   parser.add_argument("--order", "-o", type=int, default=1, help="Function order")
   parser.add_argument("--plot-savepath", type=str, default=None)
   parser.add_argument("--masses", "-m", nargs="+", type=float, default=[125], help="Masses to fit to")
+  parser.add_argument("--integrate-bins", type=float, default=-1,
+                      help="Precision for integrating the pdf over bins in the fit. 0 uses the pdf value at the bin centre. Default (-1) lets RooFit decide.")
   args = parser.parse_args()
 
   utils.applyLoggingArguments(args)  
-  main(args.in_file, args.out_file, args.masses, args.pdf_name, args.order, args.plot_savepath)
+  main(args.in_file, args.out_file, args.masses, args.pdf_name, args.order, args.plot_savepath, args.integrate_bins,
+       args.eval_backend)
@@ -1,11 +1,15 @@
+import os
 import logging
 
-import ROOT
-from finalfits import pdfs, utils, fitting, plotting
+from finalfits import arguments
 
 log = logging.getLogger(__name__)
 
-def main(in_file, out_file, pdf_name="Gaussian", order=1, plot_savepath=None):
+def main(in_file, out_file, pdf_name="Gaussian", order=1, plot_savepath=None, eval_backend="cpu",
+         out_file_append=False):
+  import ROOT
+  from finalfits import pdfs, utils, fitting, plotting
+
   x, datahist = utils.readEvents(in_file)
 
   MH = ROOT.RooRealVar("MH", "MH", 125)
@@ -14,16 +18,23 @@ def main(in_file, out_file, pdf_name="Gaussian", order=1, plot_savepath=None):
   transforms = {"mean*": [MH, 1]}
 
   pdf = getattr(pdfs, pdf_name)(x, order=order, transforms=transforms)
-  res = fitting.fit(pdf, datahist, fit_ranges=[(115, 135)], method="robust")
-  log.info(f"Fit results: {res}")
+  res = fitting.fit(pdf, datahist, fit_ranges=[(115, 135)], method="robust", eval_backend=eval_backend)
+  log.info("Fit results: %s", res)
 
   if plot_savepath:
     plotting.plotFit(datahist, pdf, pdf.x, plot_savepath, xlim=(115, 135))
 
   wsig = ROOT.RooWorkspace("w", "w")
   wsig.Import(datahist)
-  wsig.Import(pdf.roopdf)
-  wsig.writeToFile(out_file)
+  wsig.Import(pdf.roopdf, RecycleConflictNodes=True, Silence=True)
+  if out_file_append:
+    # accumulate fits from several invocations in one file, one workspace per input file
+    name = "w_" + os.path.splitext(os.path.basename(in_file))[0]
+    f = ROOT.TFile(out_file, "UPDATE")
+    wsig.Write(name, ROOT.TObject.kOverwrite)
+    f.Close()
+  else:
+    wsig.writeToFile(out_file)
 
 if __name__=="__main__":
   import argparse
@@ -31,13 +42,17 @@ if __name__=="__main__":
                     prog='Signal Fitter',
                     description='Fits signal',
                     epilog='Text at the bottom of help')
-  utils.addLoggingArguments(parser)
+  arguments.addLoggingArguments(parser)
+  arguments.addEvalBackendArguments(parser)
   parser.add_argument("in_file", type=str)
   parser.add_argument("out_file", type=str)
-  parser.add_argument("--pdf-name", "-p", type=str, default="Gaussian", choices=pdfs.available_pdfs)
+  parser.add_argument("--pdf-name", "-p", type=str, default="Gaussian", choices=arguments.available_pdfs)
   parser.add_argument("--order", "-o", type=int, default=1, help="Function order")
   parser.add_argument("--plot-savepath", type=str, default=None)
+  parser.add_argument("--out-file-append", action="store_true",
+                      help="Add the workspace to out_file (as w_<in_file name>) instead of overwriting the file")
   args = parser.parse_args()
 
-  utils.applyLoggingArguments(args)  
-  main(args.in_file, args.out_file, args.pdf_name, args.order, args.plot_savepath)
+  arguments.applyLoggingArguments(args)  
+  main(args.in_file, args.out_file, args.pdf_name, args.order, args.plot_savepath, args.eval_backend,
+       args.out_file_append)
@@ -1,13 +1,13 @@
 import logging
 
-import ROOT
-
-from finalfits import pdfs, utils, toys
+from finalfits import arguments
 
 log = logging.getLogger(__name__)
 
 def main(out_file, masses, pdf_name="Gaussian", order=1, nevents=10000, randomize=False,
-         xlim=(100, 180), nbins=None, asimov=False):
+         xlim=(100, 180), nbins=None, asimov=False, integrate_bins=0, compression="lz4"):
+  import ROOT
+  from finalfits import pdfs, utils, toys
 
   if nbins is None:
     nbins = int(xlim[1]-xlim[0]) # 1 bin per GeV
@@ -27,33 +27,38 @@ def main(out_file, masses, pdf_name="Gaussian", order=1, nevents=10000, randomiz
   pdf.roopdf.Print()
   if randomize:
     pdf.randomize_params()
-  log.debug(str(pdf.roopdf).strip("\n"))
-  for p in pdf.params:
-    log.debug(str(p).strip("\n"))
+  if log.isEnabledFor(logging.DEBUG):
+    log.debug(str(pdf.roopdf).strip("\n"))
+    for p in pdf.params:
+      log.debug(str(p).strip("\n"))
 
   w = ROOT.RooWorkspace("w", "workspace")
 
   for m in masses:
     MH.setVal(m)
-    toys.generateBinned(x, pdf, nevents, w, asimov=asimov, postfix=f"_{m}")
+    toys.generateBinned(x, pdf, nevents, w, asimov=asimov, integrate_bins=integrate_bins, postfix=f"_{m}")
 
-  w.writeToFile(out_file)
+  utils.writeWorkspace(w, out_file, compression)
 
 if __name__=="__main__":
   import argparse
   parser = argparse.ArgumentParser(prog='Binned Toy Generation')        
-  utils.addLoggingArguments(parser)
+  arguments.addLoggingArguments(parser)
   parser.add_argument("out_file")
   parser.add_argument("--pdf-name", "-p", type=str, default="Gaussian", choices=["DCB", "Gaussian"])
   parser.add_argument("--order", "-o", type=int, default=1, help="Function order")
   parser.add_argument("--nevents", "-n", type=int, default=10000, help="Number of events in a generated dataset")
   parser.add_argument("--randomize", action="store_true", help="randomize the function parameters")
-  parser.add_argument("--xlim", type=utils.comma_separated_two_tuple, default=(100,180), help="Limits on x. Default is 100,180.")
+  parser.add_argument("--xlim", type=arguments.comma_separated_two_tuple, default=(100,180), help="Limits on x. Default is 100,180.")
   parser.add_argument("--nbins", type=int, default=None, help="Number of bins in histogram. Default is 1/GeV.")
   parser.add_argument("--asimov", action="store_true", help="Generated asimov dataset(s)")
+  parser.add_argument("--integrate-bins", type=float, default=0,
+                      help="Integrate the pdf over each bin to this precision when generating. Default (0) uses the pdf value at the bin centre.")
   parser.add_argument("--masses", "-m", nargs="+", type=float, default=[125], help="Masses to generate datasets for")
+  parser.add_argument("--compression", type=str, default="lz4", choices=list(arguments.compression_settings),
+                      help="Compression of the output file. Default is lz4 (fast writes, slightly larger files).")
   args = parser.parse_args()
  
-  utils.applyLoggingArguments(args)  
+  arguments.applyLoggingArguments(args)  
   main(args.out_file, args.masses, args.pdf_name, args.order, args.nevents,
-       args.randomize, args.xlim, args.nbins, args.asimov)
\ No newline at end of file
+       args.randomize, args.xlim, args.nbins, args.asimov, args.integrate_bins, args.compression)
\ No newline at end of file
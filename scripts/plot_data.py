@@ -1,13 +1,19 @@
 import argparse
 
-from finalfits import utils, plotting
+from finalfits import arguments
 
-parser = argparse.ArgumentParser(prog='Binned Toy Generation')        
-utils.addLoggingArguments(parser)
-parser.add_argument("in_file")
-parser.add_argument("out_file")
-args = parser.parse_args()
-utils.applyLoggingArguments(args)
+def main(in_file, out_file):
+  from finalfits import utils, plotting
 
-x, data = utils.readEvents(args.in_file)
-plotting.plotHist(data, x, args.out_file)
+  x, data = utils.readEvents(in_file)
+  plotting.plotHist(data, out_file)
+
+if __name__=="__main__":
+  parser = argparse.ArgumentParser(prog='Binned Toy Generation')        
+  arguments.addLoggingArguments(parser)
+  parser.add_argument("in_file")
+  parser.add_argument("out_file")
+  args = parser.parse_args()
+  arguments.applyLoggingArguments(args)
+
+  main(args.in_file, args.out_file)
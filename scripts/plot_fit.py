@@ -1,27 +1,33 @@
 import logging
 import argparse
 
-from finalfits import utils, plotting, read_write as rw
+from finalfits import arguments
 
 log = logging.getLogger(__name__)
 
-parser = argparse.ArgumentParser(
-                  prog='Signal Fitter',
-                  description='Fits signal',
-                  epilog='Text at the bottom of help')
-utils.addLoggingArguments(parser)
-parser.add_argument("data_path", type=str)
-parser.add_argument("pdf_path", type=str)
-parser.add_argument("plot_savepath", type=str)
-args = parser.parse_args()
-
-utils.applyLoggingArguments(args)  
-
-datahist = rw.get_data(args.data_path)
-w = rw.get_workspace(args.pdf_path)
-pdf = w.pdf("DCB1")
-x = w.var("x")
-MH = w.var("MH")
-MH.setVal(126)
-
-plotting.plotFit(datahist, pdf, x, args.plot_savepath)
+def main(data_path, pdf_path, plot_savepath):
+  from finalfits import utils, plotting, read_write as rw
+
+  datahist = rw.get_data(data_path)
+  w = rw.get_workspace(pdf_path)
+  pdf = w.pdf("DCB1")
+  x = w.var("x")
+  MH = w.var("MH")
+  MH.setVal(126)
+
+  plotting.plotFit(datahist, pdf, x, plot_savepath)
+
+if __name__=="__main__":
+  parser = argparse.ArgumentParser(
+                    prog='Signal Fitter',
+                    description='Fits signal',
+                    epilog='Text at the bottom of help')
+  arguments.addLoggingArguments(parser)
+  parser.add_argument("data_path", type=str)
+  parser.add_argument("pdf_path", type=str)
+  parser.add_argument("plot_savepath", type=str)
+  args = parser.parse_args()
+
+  arguments.applyLoggingArguments(args)  
+
+  main(args.data_path, args.pdf_path, args.plot_savepath)
@@ -1,3 +1,5 @@
+import functools
+
 import pytest
 
 import numpy as np
@@ -21,12 +23,27 @@ fitting_tests += [
   if order <= getattr(pdfs, pdf_name).max_order
 ]
 
+@pytest.fixture(scope="module")
+def asimov_cache():
+  """The asimov dataset only depends on the pdf and its order so it is generated once for every method and blinding"""
+  @functools.lru_cache(maxsize=None)
+  def generate(pdf_name, order, nbins):
+    r = (115, 135) if pdf_name in ["Gaussian", "DCB"] else (100, 180)
+    x = ROOT.RooRealVar("x", "x", r[0], r[1])
+    x.setBins(nbins)
+
+    pdf = getattr(pdfs, pdf_name)(x, order=order)
+    pdf.randomize_params(seed=0)
+    datahist = toys.generateBinned(x, pdf, 100000, asimov=True)
+    return x, pdf.free_params_vals, datahist
+
+  return generate
+
 @pytest.mark.parametrize("pdf_name,order,method,blind_status,chi2_threshold", fitting_tests)
-def test_fit(pdf_name, order, method, blind_status, chi2_threshold):
-  r = (115, 135) if pdf_name in ["Gaussian", "DCB"] else (100, 180)
+def test_fit(pdf_name, order, method, blind_status, chi2_threshold, asimov_cache):
   nbins = 80
-  x = ROOT.RooRealVar("x", "x", r[0], r[1])
-  x.setBins(nbins)
+  x, true_params_vals, datahist = asimov_cache(pdf_name, order, nbins)
+  r = (x.getMin(), x.getMax())
 
   if blind_status == "blinded":
     # blind in the middle by 10% of the range
@@ -37,8 +54,7 @@ def test_fit(pdf_name, order, method, blind_status, chi2_threshold):
     fit_ranges = ((r[0], r[1]), )
 
   pdf = getattr(pdfs, pdf_name)(x, order=order)
-  pdf.randomize_params(seed=0)
-  datahist = toys.generateBinned(x, pdf, 100000, asimov=True)
+  pdf.free_params_vals = true_params_vals
 
   fitting.fit(pdf, datahist, method=method, fit_ranges=fit_ranges, seed=0)
   
@@ -47,7 +63,7 @@ def test_fit(pdf_name, order, method, blind_status, chi2_threshold):
   chi2_dof = chi2 / dof
   
   if chi2_dof > chi2_threshold:
-    plotting.plotFit(datahist, pdf, f"tests/plots/{pdf_name}{order}_{method}_{blind_status}")
+    plotting.plotFit(datahist, pdf, pdf.x, f"tests/plots/{pdf_name}{order}_{method}_{blind_status}")
     
   assert chi2_dof <= chi2_threshold
   
@@ -73,6 +89,32 @@ def test_fit_transformed_param():
 
   chi2_threshold = 0.02
   if chi2_dof > chi2_threshold:
-    plotting.plotFit(datahist, pdf, f"tests/plots/test_fit_transformed_param")
+    plotting.plotFit(datahist, pdf, pdf.x, "tests/plots/test_fit_transformed_param")
 
   assert chi2_dof <= chi2_threshold
+
+@pytest.mark.parametrize("config", ["transforms", "polys"])
+def test_propagate_errors(config):
+  x = ROOT.RooRealVar("x", "x", 115, 135)
+  x.setBins(80)
+
+  MH = ROOT.RooRealVar("MH", "MH", 125)
+  MH.setConstant(True)
+
+  if config == "transforms":
+    pdf = pdfs.Gaussian(x, transforms={"mean*": [MH, 1]})
+  else:
+    pdf = pdfs.Gaussian(x, polys={"sigma*": [MH, 1]})
+    # with a single mass the constant term is degenerate with the linear one
+    pdf.params["sigma1_polycoeff0"].setConstant(True)
+  datahist = toys.generateBinned(x, pdf, 100000, asimov=True)
+
+  fitting.fit(pdf, datahist, method="from_defaults")
+
+  errs = pdf.propagate_errors(pdf.fit_result)
+  for name, p in pdf.final_params.items():
+    assert errs[name] == pytest.approx(p.getPropagatedError(pdf.fit_result), rel=1e-3, abs=1e-9)
+
+  assert pdf.final_params_errs == errs
+  pdf.randomize_params(seed=0)
+  assert not pdf.fit_result_is_current()